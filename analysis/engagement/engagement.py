@@ -0,0 +1,214 @@
+import pandas as pd
+import numpy as np
+
+from analysis.visualization.charts import (
+    get_figure,
+    bar_chart,
+    render_figure,
+)
+
+# Constants
+TRACK_DONE = 'trackdone'
+# A play that ends early, before this share of the track, is a "true" skip
+TRUE_SKIP_MAX_COMPLETION = 0.3
+COMPLETION_BINS = np.array([0.25, 0.5, 0.75, 0.95])
+COMPLETION_LABELS = ['0-25%', '25-50%', '50-75%', '75-95%', '95-100%']
+
+# Track codes
+def factorize_tracks(df):
+    """
+    Give every play a dense integer code per track.
+
+    Categorical columns already hold such codes, so their categories are used
+    as the tracks and nothing is hashed.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data
+
+    Returns:
+    Tuple of the code of every play (-1 for a missing URI) and the track URIs
+    """
+    track_uris = df['spotify_track_uri']
+    if isinstance(track_uris.dtype, pd.CategoricalDtype):
+        return track_uris.cat.codes.to_numpy(), pd.Index(track_uris.cat.categories)
+    return pd.factorize(track_uris)
+
+# Track duration index
+def build_track_duration_index(df, codes=None, uris=None):
+    """
+    Infer the full duration of each track from the listening history.
+
+    The duration of a track is the longest play that ended with 'trackdone'.
+    Tracks never played to the end fall back to their longest play, which is
+    only a lower bound of the real duration.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data with spotify_track_uri,
+    ms_played and reason_end as columns
+    codes, uris: Optional output of factorize_tracks for df
+
+    Returns:
+    Dict containing the track URIs, their duration (ms) looked up by code
+    and whether each duration comes from a finished play
+    """
+    if codes is None:
+        codes, uris = factorize_tracks(df)
+    ms_played = df['ms_played'].to_numpy(dtype=np.int64)
+    known = codes >= 0
+    finished = known & (df['reason_end'] == TRACK_DONE).to_numpy()
+
+    # Longest finished play per track
+    finished_durations = np.zeros(len(uris), dtype=np.int64)
+    np.maximum.at(finished_durations, codes[finished], ms_played[finished])
+
+    # Longest play of any kind, for tracks never played to the end
+    longest_plays = np.zeros(len(uris), dtype=np.int64)
+    np.maximum.at(longest_plays, codes[known], ms_played[known])
+
+    from_trackdone = finished_durations > 0
+    durations = np.where(from_trackdone, finished_durations, longest_plays)
+
+    return {
+        'uris': uris,
+        'durations_ms': durations,
+        'from_trackdone': from_trackdone
+    }
+
+def lookup_track_codes(duration_index, df):
+    """
+    Return the code of each play of df in a track duration index.
+
+    Parameters:
+    duration_index (dict): Output of build_track_duration_index
+    df (pandas.DataFrame): Spotify listening data
+
+    Returns:
+    numpy.ndarray: Code of each play, -1 for tracks missing from the index
+    """
+    track_uris = df['spotify_track_uri']
+    # Categorical columns already hold dense codes
+    if isinstance(track_uris.dtype, pd.CategoricalDtype) and track_uris.cat.categories.equals(duration_index['uris']):
+        return track_uris.cat.codes.to_numpy()
+    return duration_index['uris'].get_indexer(track_uris)
+
+# Completion ratio of every play
+def calculate_play_completion(df, duration_index=None, codes=None):
+    """
+    Calculate how much of each track was heard on every play.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data
+    duration_index (dict): Optional output of build_track_duration_index,
+    built from df when not given
+    codes (numpy.ndarray): Optional code of every play in duration_index,
+    looked up when not given
+
+    Returns:
+    pandas.DataFrame: Track duration, whether it comes from a finished play,
+    completion ratio, completion bucket and true skip flag of every play,
+    aligned on the index of df. The last three are missing when the duration
+    of the track is only a lower bound (never played to the end).
+    """
+    if duration_index is None:
+        codes, uris = factorize_tracks(df)
+        duration_index = build_track_duration_index(df, codes, uris)
+    elif codes is None:
+        codes = lookup_track_codes(duration_index, df)
+
+    # Dense lookup of the duration of each play, code -1 picks the trailing "unknown" entry
+    durations = np.append(duration_index['durations_ms'], 0).astype(float)
+    from_trackdone = np.append(duration_index['from_trackdone'], False)
+    play_durations = durations[codes]
+    play_durations[play_durations == 0] = np.nan
+    # A track never played to the end only has a lower bound of its duration,
+    # which would make its longest play look complete
+    duration_known = from_trackdone[codes]
+
+    completion_ratio = np.clip(df['ms_played'].to_numpy() / play_durations, 0, 1)
+    completion_ratio[~duration_known] = np.nan
+
+    # Bucket codes, -1 (missing) when the duration is unknown
+    bucket_codes = np.searchsorted(COMPLETION_BINS, completion_ratio, side='right')
+    bucket_codes[np.isnan(completion_ratio)] = -1
+    completion_bucket = pd.Categorical.from_codes(bucket_codes, categories=COMPLETION_LABELS, ordered=True)
+
+    # True skip flag, missing (NA) when the duration is unknown
+    ended_early = (df['reason_end'] != TRACK_DONE).to_numpy()
+    true_skip = pd.array(ended_early & (completion_ratio < TRUE_SKIP_MAX_COMPLETION), dtype='boolean')
+    true_skip[~duration_known] = pd.NA
+
+    return pd.DataFrame({
+        'track_duration_ms': play_durations,
+        'duration_known': duration_known,
+        'completion_ratio': completion_ratio,
+        'completion_bucket': completion_bucket,
+        'true_skip': true_skip
+    }, index=df.index)
+
+# Track completion and true skips
+def analyze_engagement(df, plot=True, output_path=None):
+    """
+    Analyze how much of each track is actually heard.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
+
+    Returns:
+    Dict containing completion and true skip insights
+    """
+    # Codes are computed once and shared by the index and the lookup
+    codes, uris = factorize_tracks(df)
+    duration_index = build_track_duration_index(df, codes, uris)
+    play_completion = calculate_play_completion(df, duration_index, codes)
+
+    # Share of plays in each completion bucket, among plays of a known duration
+    completion_buckets = play_completion['completion_bucket'].value_counts(normalize=True, sort=False) * 100
+
+    # Skip rates: flagged by Spotify vs ended early (among plays of a known duration),
+    # NaN when no play has a known duration
+    true_skip_rate = play_completion['true_skip'].mean()
+    skip_rates = pd.Series({
+        'Flagged skip': df['skipped'].mean() * 100,
+        'True skip': np.nan if pd.isna(true_skip_rate) else true_skip_rate * 100
+    }, dtype=float)
+
+    # Plays left out of the completion metrics
+    unknown_duration_percent = (~play_completion['duration_known']).mean() * 100
+
+    results = {
+        'duration_index': duration_index,
+        'play_completion': play_completion,
+        'average_completion': play_completion['completion_ratio'].mean(),
+        'completion_buckets': completion_buckets,
+        'skip_rates': skip_rates,
+        'unknown_duration_percent': unknown_duration_percent
+    }
+
+    # Visualization
+    if plot:
+        plot_engagement(results, output_path)
+
+    return results
+
+def plot_engagement(engagement_insights, output_path=None):
+    """
+    Plot the completion buckets and the flagged vs true skip rates.
+
+    Parameters:
+    engagement_insights (dict): Output of analyze_engagement
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    fig, (bucket_ax, skip_ax) = get_figure('engagement', ncols=2, output_path=output_path)
+
+    # Completion buckets
+    unknown = engagement_insights['unknown_duration_percent']
+    bar_chart(bucket_ax, engagement_insights['completion_buckets'], 'Share of Track Heard per Play',
+              f'Completion ({unknown:.1f}% of plays with an unknown duration left out)', 'Plays (%)')
+
+    # Skip rates
+    bar_chart(skip_ax, engagement_insights['skip_rates'], 'Flagged vs True Skip Rate',
+              'Skip Definition', 'Skip Rate (%)')
+
+    render_figure(fig, output_path)
@@ -1,63 +1,85 @@
-import pandas as pd
-import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
+from data.materialized_views import load_view
+from analysis.visualization.charts import (
+    limit_categories,
+    get_figure,
+    bar_chart,
+    render_figure,
+)
 
 # Constants
 MS_TO_MINUTES = 60000
+MAX_CATEGORIES = 10
 
 # Shuffle vs non-shuffle listening
-def analyze_shuffle_listening(df):
+def analyze_shuffle_listening(df, plot=True, output_path=None, use_views=False):
     """
     Analyze shuffle vs non-shuffle listening behavior.
     
     Parameters:
     df (pandas.DataFrame): Spotify listening data
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
+    use_views (bool): Read the stored summary table when it is fresh. Only for the
+    DataFrame the views were built from, unchanged since (see build_materialized_views)
     
     Returns:
     Dict containing shuffle listening insights
     """
-    # Shuffle usage metrics
-    shuffle_metrics = df.groupby('shuffle').agg({
-        'ms_played': ['count', 'sum', 'mean'],
-        'skipped': 'mean'
-    })
-    
-    # Convert metrics
-    shuffle_metrics['ms_played', 'sum'] /= MS_TO_MINUTES  # Convert to minutes
-    shuffle_metrics.columns = ['play_count', 'total_listening_minutes', 'avg_listening_minutes', 'skip_rate']
+    # Stored summary table, when asked for and up to date
+    results = load_view(df, 'shuffle_listening') if use_views else None
+    if results is None:
+        # Shuffle usage metrics
+        shuffle_metrics = df.groupby('shuffle').agg({
+            'ms_played': ['count', 'sum', 'mean'],
+            'skipped': 'mean'
+        })
+    
+        # Convert metrics
+        shuffle_metrics['ms_played', 'sum'] /= MS_TO_MINUTES  # Convert to minutes
+        shuffle_metrics.columns = ['play_count', 'total_listening_minutes', 'avg_listening_minutes', 'skip_rate']
+    
+        results = {
+            'shuffle_metrics': shuffle_metrics
+        }
     
     # Visualization
-    plt.figure(figsize=(12, 5))
+    if plot:
+        plot_shuffle_listening(results, output_path)
+    
+    return results
+
+def plot_shuffle_listening(shuffle_insights, output_path=None):
+    """
+    Plot the number of sessions and the listening time with and without shuffle.
+    
+    Parameters:
+    shuffle_insights (dict): Output of analyze_shuffle_listening
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    shuffle_metrics = shuffle_insights['shuffle_metrics']
+    
+    fig, (count_ax, time_ax) = get_figure('shuffle_listening', ncols=2, output_path=output_path)
     
     # Play count comparison
-    plt.subplot(1, 2, 1)
-    shuffle_metrics['play_count'].plot(kind='bar')
-    plt.title('Listening Sessions: Shuffle vs Non-Shuffle')
-    plt.xlabel('Shuffle')
-    plt.ylabel('Number of Sessions')
+    bar_chart(count_ax, shuffle_metrics['play_count'], 'Listening Sessions: Shuffle vs Non-Shuffle',
+              'Shuffle', 'Number of Sessions', rotation=90)
     
     # Total listening time comparison
-    plt.subplot(1, 2, 2)
-    shuffle_metrics['total_listening_minutes'].plot(kind='bar')
-    plt.title('Total Listening Time: Shuffle vs Non-Shuffle')
-    plt.xlabel('Shuffle')
-    plt.ylabel('Listening Time (Minutes)')
+    bar_chart(time_ax, shuffle_metrics['total_listening_minutes'],
+              'Total Listening Time: Shuffle vs Non-Shuffle', 'Shuffle', 'Listening Time (Minutes)',
+              rotation=90)
     
-    plt.tight_layout()
-    plt.show()
-    
-    return {
-        'shuffle_metrics': shuffle_metrics
-    }
+    render_figure(fig, output_path)
     
 # Reason for track start/end
-def analyze_track_start_end_reasons(df):
+def analyze_track_start_end_reasons(df, plot=True, output_path=None):
     """
     Analyze reasons for track start and end.
     
     Parameters:
     df (pandas.DataFrame): Spotify listening data
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
     
     Returns:
     Dict containing start and end reason insights
@@ -70,38 +92,36 @@ def analyze_track_start_end_reasons(df):
     end_reasons = df['reason_end'].value_counts()
     end_reasons_percent = end_reasons / len(df) * 100
     
-    # Visualization
-    plt.figure(figsize=(15, 5))
-    
-    # Start reasons
-    # plt.subplot(1, 2, 1)
-    # start_reasons_percent.plot(kind='pie', autopct='%1.1f%%')
-    # plt.title('Reasons for Track Start')
-    
-    plt.subplot(1, 2, 1)
-    start_reasons_percent.plot(kind='bar')
-    plt.title('Reasons for Track Start')
-    plt.xlabel('Start Reason')
-    plt.ylabel('Start Reason Percentage')
-    
-    # End reasons
-    # plt.subplot(1, 2, 2)
-    # end_reasons_percent.plot(kind='pie', autopct='%1.1f%%')
-    # plt.title('Reasons for Track End')
-
-    plt.subplot(1, 2, 2)
-    end_reasons_percent.plot(kind='bar')
-    plt.title('Reasons for Track End')
-    plt.xlabel('End Reason')
-    plt.ylabel('End Reason Count')
-    
-    plt.tight_layout()
-    plt.show()
-    
-    return {
+    results = {
         'start_reasons_count': start_reasons,
         'start_reasons_percent': start_reasons_percent,
         'end_reasons_count': end_reasons,
         'end_reasons_percent': end_reasons_percent
     }
     
+    # Visualization
+    if plot:
+        plot_track_start_end_reasons(results, output_path)
+    
+    return results
+
+def plot_track_start_end_reasons(track_reason_insights, output_path=None):
+    """
+    Plot the share of each track start and end reason.
+    
+    Parameters:
+    track_reason_insights (dict): Output of analyze_track_start_end_reasons
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    fig, (start_ax, end_ax) = get_figure('track_start_end_reasons', ncols=2, figsize=(15, 5),
+                                         output_path=output_path)
+    
+    # Start reasons
+    bar_chart(start_ax, limit_categories(track_reason_insights['start_reasons_percent'], MAX_CATEGORIES),
+              'Reasons for Track Start', 'Start Reason', 'Start Reason Percentage', rotation=90)
+    
+    # End reasons
+    bar_chart(end_ax, limit_categories(track_reason_insights['end_reasons_percent'], MAX_CATEGORIES),
+              'Reasons for Track End', 'End Reason', 'End Reason Percentage', rotation=90)
+    
+    render_figure(fig, output_path)
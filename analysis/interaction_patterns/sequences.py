@@ -0,0 +1,214 @@
+import pandas as pd
+import numpy as np
+
+from analysis.visualization.charts import (
+    get_figure,
+    heatmap_chart,
+    render_figure,
+)
+
+# Constants
+TOP_K_NEXT_ARTISTS = 5
+
+# Chronological order of the plays
+def play_order(df):
+    """
+    Return the positions of the plays sorted by timestamp.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data with a ts column
+
+    Returns:
+    numpy.ndarray: Positions of the rows of df in chronological order
+    """
+    timestamps = df['ts']
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps)
+    # Timezone aware columns would give an object array of Timestamps, sorted very slowly
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert('UTC').dt.tz_localize(None)
+    return np.argsort(timestamps.to_numpy(dtype='datetime64[ns]').view(np.int64), kind='stable')
+
+def _ordered_codes(series, order):
+    # Integer code of each value (-1 when missing) in chronological order
+    codes, labels = pd.factorize(series)
+    return codes[order], labels
+
+# Transition counts between consecutive plays
+def build_transition_matrix(from_codes, to_codes, n_from, n_to):
+    """
+    Count the transitions between two aligned arrays of integer codes.
+
+    Parameters:
+    from_codes (numpy.ndarray): Code of the state each transition leaves, -1 to ignore it
+    to_codes (numpy.ndarray): Code of the state each transition reaches, -1 to ignore it
+    n_from, n_to (int): Number of possible states on each side
+
+    Returns:
+    numpy.ndarray: Matrix of shape (n_from, n_to) holding the transition counts
+    """
+    valid = (from_codes >= 0) & (to_codes >= 0)
+    flat_codes = from_codes[valid].astype(np.int64) * n_to + to_codes[valid]
+    return np.bincount(flat_codes, minlength=n_from * n_to).reshape(n_from, n_to)
+
+def transition_probabilities(transition_counts):
+    """
+    Turn a transition count table into row-wise probabilities.
+
+    Parameters:
+    transition_counts (pandas.DataFrame): Transition counts, rows are the states left
+
+    Returns:
+    pandas.DataFrame: Probability of reaching each state, rows sum to 1 (or 0 when empty)
+    """
+    row_totals = transition_counts.sum(axis=1)
+    return transition_counts.div(row_totals.where(row_totals > 0, 1), axis=0)
+
+# reason_end -> next reason_start
+def calculate_reason_transitions(df, order=None):
+    """
+    Count how the reason a play ended leads to the reason the next play started.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data
+    order (numpy.ndarray): Optional chronological order from play_order
+
+    Returns:
+    pandas.DataFrame: Transition counts, reason_end as rows and next reason_start as columns
+    """
+    if order is None:
+        order = play_order(df)
+    end_codes, end_reasons = _ordered_codes(df['reason_end'], order)
+    start_codes, start_reasons = _ordered_codes(df['reason_start'], order)
+
+    counts = build_transition_matrix(end_codes[:-1], start_codes[1:], len(end_reasons), len(start_reasons))
+    return pd.DataFrame(counts, index=pd.Index(end_reasons, name='reason_end'),
+                        columns=pd.Index(start_reasons, name='next_reason_start'))
+
+# Platform switches
+def calculate_platform_transitions(df, order=None):
+    """
+    Count the platform changes between consecutive plays.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data
+    order (numpy.ndarray): Optional chronological order from play_order
+
+    Returns:
+    pandas.DataFrame: Transition counts, platform as rows and next platform as columns
+    """
+    if order is None:
+        order = play_order(df)
+    platform_codes, platforms = _ordered_codes(df['platform'], order)
+
+    counts = build_transition_matrix(platform_codes[:-1], platform_codes[1:], len(platforms), len(platforms))
+    return pd.DataFrame(counts, index=pd.Index(platforms, name='platform'),
+                        columns=pd.Index(platforms, name='next_platform'))
+
+# Artist -> next artist
+def calculate_artist_transitions(df, top_k=TOP_K_NEXT_ARTISTS, order=None):
+    """
+    Find the artists most often played right after each artist.
+
+    Only the observed pairs are counted, so the result stays small (sparse)
+    even with tens of thousands of artists.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data
+    top_k (int): Number of next artists kept per artist
+    order (numpy.ndarray): Optional chronological order from play_order
+
+    Returns:
+    pandas.DataFrame: One row per (artist, next_artist) pair with its count and
+    the probability of the next artist given the artist
+    """
+    if order is None:
+        order = play_order(df)
+    artist_codes, artists = _ordered_codes(df['artist_name'], order)
+    n_artists = len(artists)
+
+    from_codes = artist_codes[:-1]
+    to_codes = artist_codes[1:]
+    valid = (from_codes >= 0) & (to_codes >= 0)
+    pair_codes = from_codes[valid].astype(np.int64) * n_artists + to_codes[valid]
+
+    # Count each observed pair
+    pair_codes, counts = np.unique(pair_codes, return_counts=True)
+    from_codes = pair_codes // n_artists
+    to_codes = pair_codes % n_artists
+    totals = np.bincount(from_codes, weights=counts, minlength=n_artists)
+
+    # Sort by artist then count (descending), and keep the first top_k of each artist
+    ranking = np.lexsort((-counts, from_codes))
+    from_codes, to_codes, counts = from_codes[ranking], to_codes[ranking], counts[ranking]
+    group_starts = np.searchsorted(from_codes, from_codes, side='left')
+    keep = (np.arange(len(from_codes)) - group_starts) < top_k
+    from_codes, to_codes, counts = from_codes[keep], to_codes[keep], counts[keep]
+
+    return pd.DataFrame({
+        'artist_name': artists.take(from_codes),
+        'next_artist_name': artists.take(to_codes),
+        'count': counts,
+        'probability': counts / totals[from_codes]
+    })
+
+# Play sequence transitions
+def analyze_play_transitions(df, top_k=TOP_K_NEXT_ARTISTS, plot=True, output_path=None):
+    """
+    Analyze the transitions between consecutive plays.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data
+    top_k (int): Number of next artists kept per artist
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
+
+    Returns:
+    Dict containing reason, platform and artist transition insights
+    """
+    order = play_order(df)
+
+    reason_transitions = calculate_reason_transitions(df, order)
+    platform_transitions = calculate_platform_transitions(df, order)
+    artist_transitions = calculate_artist_transitions(df, top_k, order)
+
+    # Share of consecutive plays on a different platform
+    total_transitions = platform_transitions.to_numpy().sum()
+    platform_switches = total_transitions - np.trace(platform_transitions.to_numpy())
+    platform_switch_rate = platform_switches / total_transitions * 100 if total_transitions else 0.0
+
+    results = {
+        'reason_transitions': reason_transitions,
+        'reason_transition_probabilities': transition_probabilities(reason_transitions),
+        'platform_transitions': platform_transitions,
+        'platform_transition_probabilities': transition_probabilities(platform_transitions),
+        'platform_switch_rate': platform_switch_rate,
+        'artist_transitions': artist_transitions
+    }
+
+    # Visualization
+    if plot:
+        plot_play_transitions(results, output_path)
+
+    return results
+
+def plot_play_transitions(transition_insights, output_path=None):
+    """
+    Plot the reason and platform transition probabilities as heatmaps.
+
+    Parameters:
+    transition_insights (dict): Output of analyze_play_transitions
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    fig, (reason_ax, platform_ax) = get_figure('play_transitions', ncols=2, figsize=(15, 6),
+                                               output_path=output_path)
+
+    # reason_end -> next reason_start
+    heatmap_chart(reason_ax, transition_insights['reason_transition_probabilities'],
+                  'Track End Reason -> Next Start Reason', 'Next Start Reason', 'End Reason')
+
+    # Platform switches
+    heatmap_chart(platform_ax, transition_insights['platform_transition_probabilities'],
+                  'Platform -> Next Platform', 'Next Platform', 'Platform')
+
+    render_figure(fig, output_path)
@@ -1,108 +1,122 @@
-import pandas as pd
-import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
+from data.materialized_views import load_view
+from analysis.visualization.charts import (
+    limit_categories,
+    get_figure,
+    bar_chart,
+    render_figure,
+)
 
 # Constants
 MS_TO_MINUTES = 60000
+MAX_CATEGORIES = 10
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
 # Total listening time by artist
-def calculate_artist_listening_time(your_dataframe):
+def calculate_artist_listening_time(your_dataframe, use_views=False):
     """
     Calculate total listening time in minutes for each artist.
     
     Parameters:
     your_dataframe (pandas.DataFrame): DataFrame containing Spotify listening data.
     and has artist_name, ms_played as columns
+    use_views (bool): Read the stored summary table when it is fresh. Only for the
+    DataFrame the views were built from, unchanged since (see build_materialized_views)
     
     Returns:
     pandas.Series: Total listening time in minutes per artist, sorted descending
     """
-    # Convert milliseconds to minutes and group by artist
-    artist_listening_time = your_dataframe.groupby('artist_name')['ms_played'].sum() / MS_TO_MINUTES
+    # Stored summary table, when asked for and up to date
+    artist_listening_time = load_view(your_dataframe, 'artist_listening_time') if use_views else None
+    if artist_listening_time is None:
+        # Convert milliseconds to minutes and group by artist
+        artist_listening_time = your_dataframe.groupby('artist_name')['ms_played'].sum() / MS_TO_MINUTES
     
-    # Sort in descending order of total listening time
-    return artist_listening_time.sort_values(ascending=False)
+        # Sort in descending order of total listening time
+        artist_listening_time = artist_listening_time.sort_values(ascending=False)
+    
+    return artist_listening_time
 
 # Function to visualize artist Listening time using Bar Chart
-def plot_artist_listening_time(artist_listening_time, top_n=10):
+def plot_artist_listening_time(artist_listening_time, top_n=10, output_path=None):
     """
     Create a bar chart of total listening time for top artists.
     
     Parameters:
     artist_listening_time (pandas.Series): Total listening time per artist
     top_n (int): Number of top artists to display (default 10)
+    output_path (str): Optional image path to save the chart instead of showing it
     """
     # Select top N artists
-    top_artists = artist_listening_time.head(top_n)
-    
-    # Set up the plot style
-    plt.figure(figsize=(12, 6))
-    sns.set(style="whitegrid")
+    top_artists = limit_categories(artist_listening_time, top_n, other_label=None)
     
-    # Create bar plot
-    sns.barplot(x=top_artists.index, y=top_artists.values)
-    
-    # Customize the plot
-    plt.title(f'Top {top_n} Artists by Total Listening Time', fontsize=15)
-    plt.xlabel('Artist', fontsize=12)
-    plt.ylabel('Listening Time (Minutes)', fontsize=12)
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
+    fig, (ax,) = get_figure('artist_listening_time', figsize=(12, 6), output_path=output_path)
+    bar_chart(ax, top_artists, f'Top {top_n} Artists by Total Listening Time',
+              'Artist', 'Listening Time (Minutes)', rotation=45, ha='right', fontsize=12)
     
     # Show the plot
-    plt.show()
+    render_figure(fig, output_path)
     
 # Peak listening hours and days
-def analyze_peak_listening_times(df):
+def analyze_peak_listening_times(df, plot=True, output_path=None):
     """
     Analyze peak listening hours and days.
     
     Parameters:
     df (pandas.DataFrame): Spotify listening data
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
     
     Returns:
     Dict containing analysis results and visualization methods
     """
     # Peak hours analysis
     hourly_listening = df.groupby('hour')['ms_played'].sum() / MS_TO_MINUTES
-    daily_listening = df.groupby('day')['ms_played'].sum() / MS_TO_MINUTES
+    daily_listening = df.groupby('weekday')['ms_played'].sum() / MS_TO_MINUTES
+    daily_listening.index = [DAY_NAMES[int(weekday)] for weekday in daily_listening.index]
+    
+    results = {
+        'peak_hours': hourly_listening.sort_values(ascending=False).head(),
+        'peak_days': daily_listening.sort_values(ascending=False).head(),
+        'hourly_listening': hourly_listening,
+        'daily_listening': daily_listening
+    }
     
     # Visualization of peak hours
-    plt.figure(figsize=(12, 5))
+    if plot:
+        plot_peak_listening_times(results, output_path)
+    
+    return results
+
+def plot_peak_listening_times(peak_times, output_path=None):
+    """
+    Plot listening time by hour and by day.
+    
+    Parameters:
+    peak_times (dict): Output of analyze_peak_listening_times
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    fig, (hour_ax, day_ax) = get_figure('peak_listening_times', ncols=2, output_path=output_path)
     
     # Hourly listening plot
-    plt.subplot(1, 2, 1)
-    sns.barplot(x=hourly_listening.index, y=hourly_listening.values)
-    plt.title('Listening Time by Hour', fontsize=10)
-    plt.xlabel('Hour of Day', fontsize=8)
-    plt.ylabel('Total Listening Time (Minutes)', fontsize=8)
-    plt.xticks(rotation=45)
+    bar_chart(hour_ax, peak_times['hourly_listening'], 'Listening Time by Hour',
+              'Hour of Day', 'Total Listening Time (Minutes)', rotation=45, fontsize=8)
     
     # Daily listening plot
-    plt.subplot(1, 2, 2)
-    sns.barplot(x=daily_listening.index, y=daily_listening.values)
-    plt.title('Listening Time by Day', fontsize=10)
-    plt.xlabel('Day of Week', fontsize=8)
-    plt.ylabel('Total Listening Time (Minutes)', fontsize=8)
-    plt.xticks(rotation=45)
-    
-    plt.tight_layout()
-    plt.show()
+    bar_chart(day_ax, peak_times['daily_listening'], 'Listening Time by Day of Week',
+              'Day of Week', 'Total Listening Time (Minutes)', rotation=45, fontsize=8)
     
-    return {
-        'peak_hours': hourly_listening.sort_values(ascending=False).head(),
-        'peak_days': daily_listening.sort_values(ascending=False).head()
-    }
+    render_figure(fig, output_path)
     
 # Most played tracks/artist
-def analyze_most_played_artists(df, top_n=10):
+def analyze_most_played_artists(df, top_n=10, plot=True, output_path=None):
     """
     Analyze and visualize most played artists.
     
     Parameters:
     df (pandas.DataFrame): Spotify listening data
     top_n (int): Number of top artists to display
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
     
     Returns:
     pandas.Series: Top artists by number of plays and total listening time
@@ -114,40 +128,51 @@ def analyze_most_played_artists(df, top_n=10):
     listening_time_per_artist = df.groupby('artist_name')['ms_played'].sum() / MS_TO_MINUTES
     listening_time_per_artist = listening_time_per_artist.sort_values(ascending=False).head(top_n)
     
+    results = {
+        'plays_per_artist': plays_per_artist,
+        'listening_time_per_artist': listening_time_per_artist
+    }
+    
     # Visualization
-    plt.figure(figsize=(15, 5))
+    if plot:
+        plot_most_played_artists(results, output_path)
+    
+    return results
+
+def plot_most_played_artists(most_played, output_path=None):
+    """
+    Plot the top artists by number of plays and by listening time.
+    
+    Parameters:
+    most_played (dict): Output of analyze_most_played_artists
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    plays_per_artist = most_played['plays_per_artist']
+    listening_time_per_artist = most_played['listening_time_per_artist']
+    
+    fig, (plays_ax, time_ax) = get_figure('most_played_artists', ncols=2, figsize=(15, 5),
+                                          output_path=output_path)
     
     # Number of plays plot
-    plt.subplot(1, 2, 1)
-    plays_per_artist.plot(kind='bar')
-    plt.title(f'Top {top_n} Artists by Number of Plays')
-    plt.xlabel('Artist')
-    plt.ylabel('Number of Plays')
-    plt.xticks(rotation=45, ha='right')
+    bar_chart(plays_ax, plays_per_artist, f'Top {len(plays_per_artist)} Artists by Number of Plays',
+              'Artist', 'Number of Plays', rotation=45, ha='right')
     
     # Listening time plot
-    plt.subplot(1, 2, 2)
-    listening_time_per_artist.plot(kind='bar')
-    plt.title(f'Top {top_n} Artists by Listening Time')
-    plt.xlabel('Artist')
-    plt.ylabel('Listening Time (Minutes)')
-    plt.xticks(rotation=45, ha='right')
+    bar_chart(time_ax, listening_time_per_artist,
+              f'Top {len(listening_time_per_artist)} Artists by Listening Time',
+              'Artist', 'Listening Time (Minutes)', rotation=45, ha='right')
     
-    plt.tight_layout()
-    plt.show()
-    
-    return {
-        'plays_per_artist': plays_per_artist,
-        'listening_time_per_artist': listening_time_per_artist
-    }
+    render_figure(fig, output_path)
     
 # Skip rate insight
-def analyze_skip_rates(df):
+def analyze_skip_rates(df, plot=True, output_path=None):
     """
     Analyze skip rates across different dimensions.
     
     Parameters:
     df (pandas.DataFrame): Spotify listening data
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
     
     Returns:
     Dict containing skip rate insights
@@ -172,81 +197,92 @@ def analyze_skip_rates(df):
     }).rename(columns={'skipped': 'skip_rate', 'track_name': 'total_plays'})
     hourly_skip_rates['skip_rate'] = hourly_skip_rates['skip_rate'] * 100
     
-    # Visualization
-    plt.figure(figsize=(15, 5))
-    
-    # Hourly skip rates
-    plt.subplot(1, 2, 1)
-    sns.barplot(x=hourly_skip_rates.index, y=hourly_skip_rates['skip_rate'])
-    plt.title('Skip Rates by Hour')
-    plt.xlabel('Hour of Day')
-    plt.ylabel('Skip Rate (%)')
-    plt.xticks(rotation=45)
-    
-    # Top skipped artists
-    plt.subplot(1, 2, 2)
-    sns.barplot(x=top_skipped_artists.index, y=top_skipped_artists['skip_rate'])
-    plt.title('Top 10 Artists by Skip Rate')
-    plt.xlabel('Artist')
-    plt.ylabel('Skip Rate (%)')
-    plt.xticks(rotation=45, ha='right')
-    
-    plt.tight_layout()
-    plt.show()
-    
-    return {
+    results = {
         'overall_skip_rate': overall_skip_rate,
         'top_skipped_artists': top_skipped_artists,
         'hourly_skip_rates': hourly_skip_rates
     }
     
+    # Visualization
+    if plot:
+        plot_skip_rates(results, output_path)
+    
+    return results
+
+def plot_skip_rates(skip_insights, output_path=None):
+    """
+    Plot skip rates by hour and the most skipped artists.
+    
+    Parameters:
+    skip_insights (dict): Output of analyze_skip_rates
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    fig, (hour_ax, artist_ax) = get_figure('skip_rates', ncols=2, figsize=(15, 5),
+                                           output_path=output_path)
+    
+    # Hourly skip rates
+    bar_chart(hour_ax, skip_insights['hourly_skip_rates']['skip_rate'], 'Skip Rates by Hour',
+              'Hour of Day', 'Skip Rate (%)', rotation=45)
+    
+    # Top skipped artists (rates can not be summed into an "other" bucket)
+    top_skipped = limit_categories(skip_insights['top_skipped_artists']['skip_rate'],
+                                   MAX_CATEGORIES, other_label=None)
+    bar_chart(artist_ax, top_skipped, f'Top {len(top_skipped)} Artists by Skip Rate',
+              'Artist', 'Skip Rate (%)', rotation=45, ha='right')
+    
+    render_figure(fig, output_path)
+    
 # Platform usage distribution
-def analyze_platform_usage(df):
+def analyze_platform_usage(df, plot=True, output_path=None, use_views=False):
     """
     Analyze platform usage distribution.
     
     Parameters:
     df (pandas.DataFrame): Spotify listening data
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
+    use_views (bool): Read the stored summary table when it is fresh. Only for the
+    DataFrame the views were built from, unchanged since (see build_materialized_views)
     
     Returns:
     Dict containing platform usage insights
     """
-    # Platform usage count
-    platform_counts = df['platform'].value_counts()
+    # Stored summary table, when asked for and up to date
+    results = load_view(df, 'platform_usage') if use_views else None
+    if results is None:
+        # Platform usage count
+        platform_counts = df['platform'].value_counts()
     
-    # Platform usage time (minutes)
-    platform_listening_time = df.groupby('platform')['ms_played'].sum() / MS_TO_MINUTES
+        # Platform usage time (minutes)
+        platform_listening_time = df.groupby('platform')['ms_played'].sum() / MS_TO_MINUTES
+    
+        results = {
+            'platform_counts': platform_counts,
+            'platform_listening_time': platform_listening_time
+        }
     
     # Visualization
-    plt.figure(figsize=(12, 5))
+    if plot:
+        plot_platform_usage(results, output_path)
     
-    # Platform usage count
-    # plt.subplot(1, 2, 1)
-    # platform_counts.plot(kind='pie', autopct='%1.1f%%')
-    # plt.title('Platform Usage Count')
+    return results
 
-    plt.subplot(1, 2, 1)
-    platform_counts.plot(kind='bar')
-    plt.title('Platform Usage Count')
-    plt.xlabel('Platform')
-    plt.ylabel('Count Number')
-    plt.xticks(rotation=45)
+def plot_platform_usage(platform_insights, output_path=None):
+    """
+    Plot the number of plays and the listening time per platform.
+    
+    Parameters:
+    platform_insights (dict): Output of analyze_platform_usage
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    fig, (count_ax, time_ax) = get_figure('platform_usage', ncols=2, output_path=output_path)
+    
+    # Platform usage count
+    bar_chart(count_ax, limit_categories(platform_insights['platform_counts'], MAX_CATEGORIES),
+              'Platform Usage Count', 'Platform', 'Count Number', rotation=45)
     
     # Platform listening time
-    plt.subplot(1, 2, 2)
-    platform_listening_time.plot(kind='bar')
-    plt.title('Platform Listening Time (Minutes)')
-    plt.xlabel('Platform')
-    plt.ylabel('Total Listening Time')
-    plt.xticks(rotation=45)
-    
-    plt.tight_layout()
-    plt.show()
-    
-    return {
-        'platform_counts': platform_counts,
-        'platform_listening_time': platform_listening_time
-    }
+    bar_chart(time_ax, limit_categories(platform_insights['platform_listening_time'], MAX_CATEGORIES),
+              'Platform Listening Time (Minutes)', 'Platform', 'Total Listening Time', rotation=45)
     
-# 
-    
\ No newline at end of file
+    render_figure(fig, output_path)
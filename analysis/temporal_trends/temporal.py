@@ -1,18 +1,23 @@
-import pandas as pd
-import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
+from data.materialized_views import load_view
+from analysis.visualization.charts import (
+    get_figure,
+    bar_chart,
+    line_chart,
+    render_figure,
+)
 
 # Constants
 MS_TO_MINUTES = 60000
 
 # Monthly/yearly listening patterns
-def analyze_listening_patterns(df):
+def analyze_listening_patterns(df, plot=True, output_path=None):
     """
     Analyze monthly and yearly listening patterns.
     
     Parameters:
     df (pandas.DataFrame): Spotify listening data
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
     
     Returns:
     Dict containing listening pattern insights
@@ -23,125 +28,157 @@ def analyze_listening_patterns(df):
     # Yearly listening time
     yearly_listening = df.groupby('year')['ms_played'].sum() / MS_TO_MINUTES
     
+    results = {
+        'monthly_listening': monthly_listening,
+        'yearly_listening': yearly_listening
+    }
+    
     # Visualization
-    plt.figure(figsize=(15, 5))
+    if plot:
+        plot_listening_patterns(results, output_path)
+    
+    return results
+
+def plot_listening_patterns(listening_patterns, output_path=None):
+    """
+    Plot listening time by month and by year.
+    
+    Parameters:
+    listening_patterns (dict): Output of analyze_listening_patterns
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    fig, (month_ax, year_ax) = get_figure('listening_patterns', ncols=2, figsize=(15, 5),
+                                          output_path=output_path)
     
     # Monthly listening time
-    plt.subplot(1, 2, 1)
-    monthly_listening.plot(kind='bar')
-    plt.title('Listening Time by Month')
-    plt.xlabel('Month')
-    plt.ylabel('Total Listening Time (Minutes)')
-    plt.xticks(rotation=45)
+    bar_chart(month_ax, listening_patterns['monthly_listening'], 'Listening Time by Month',
+              'Month', 'Total Listening Time (Minutes)', rotation=45)
     
     # Yearly listening time
-    plt.subplot(1, 2, 2)
-    yearly_listening.plot(kind='bar')
-    plt.title('Listening Time by Year')
-    plt.xlabel('Year')
-    plt.ylabel('Total Listening Time (Minutes)')
-    plt.xticks(rotation=45)
+    bar_chart(year_ax, listening_patterns['yearly_listening'], 'Listening Time by Year',
+              'Year', 'Total Listening Time (Minutes)', rotation=45)
     
-    plt.tight_layout()
-    plt.show()
-    
-    return {
-        'monthly_listening': monthly_listening,
-        'yearly_listening': yearly_listening
-    }
+    render_figure(fig, output_path)
     
 # Hour of day listening frequency
-def analyze_hourly_listening(df):
+def analyze_hourly_listening(df, plot=True, output_path=None, use_views=False):
     """
     Analyze listening frequency by hour of the day.
     
     Parameters:
     df (pandas.DataFrame): Spotify listening data
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
+    use_views (bool): Read the stored summary table when it is fresh. Only for the
+    DataFrame the views were built from, unchanged since (see build_materialized_views)
     
     Returns:
     Dict containing hourly listening insights
     """
-    # Listening count by hour
-    hourly_listening_count = df.groupby('hour').size()
+    # Stored summary table, when asked for and up to date
+    results = load_view(df, 'hourly_listening') if use_views else None
+    if results is None:
+        # Listening count by hour
+        hourly_listening_count = df.groupby('hour').size()
+    
+        # Listening time by hour (in minutes)
+        hourly_listening_time = df.groupby('hour')['ms_played'].sum() / MS_TO_MINUTES
     
-    # Listening time by hour (in minutes)
-    hourly_listening_time = df.groupby('hour')['ms_played'].sum() / MS_TO_MINUTES
+        results = {
+            'hourly_listening_count': hourly_listening_count,
+            'hourly_listening_time': hourly_listening_time
+        }
     
     # Visualization
-    plt.figure(figsize=(15, 5))
+    if plot:
+        plot_hourly_listening(results, output_path)
+    
+    return results
+
+def plot_hourly_listening(hourly_insights, output_path=None):
+    """
+    Plot the number of listening sessions and the listening time per hour.
+    
+    Parameters:
+    hourly_insights (dict): Output of analyze_hourly_listening
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    fig, (count_ax, time_ax) = get_figure('hourly_listening', ncols=2, figsize=(15, 5),
+                                          output_path=output_path)
     
     # Listening count by hour
-    plt.subplot(1, 2, 1)
-    hourly_listening_count.plot(kind='bar')
-    plt.title('Listening Frequency by Hour')
-    plt.xlabel('Hour of Day')
-    plt.ylabel('Number of Listening Sessions')
-    plt.xticks(rotation=45)
+    bar_chart(count_ax, hourly_insights['hourly_listening_count'], 'Listening Frequency by Hour',
+              'Hour of Day', 'Number of Listening Sessions', rotation=45)
     
     # Listening time by hour
-    plt.subplot(1, 2, 2)
-    hourly_listening_time.plot(kind='bar')
-    plt.title('Listening Time by Hour')
-    plt.xlabel('Hour of Day')
-    plt.ylabel('Total Listening Time (Minutes)')
-    plt.xticks(rotation=45)
-    
-    plt.tight_layout()
-    plt.show()
-    
-    return {
-        'hourly_listening_count': hourly_listening_count,
-        'hourly_listening_time': hourly_listening_time
-    }
+    bar_chart(time_ax, hourly_insights['hourly_listening_time'], 'Listening Time by Hour',
+              'Hour of Day', 'Total Listening Time (Minutes)', rotation=45)
+    
+    render_figure(fig, output_path)
     
 # Year-over-year listening behavior changes
-def analyze_year_over_year_changes(df):
+def analyze_year_over_year_changes(df, plot=True, output_path=None, use_views=False):
     """
     Analyze year-over-year listening behavior changes.
     
     Parameters:
     df (pandas.DataFrame): Spotify listening data
+    plot (bool): Whether to draw the chart, pass False to only compute the results
+    output_path (str): Optional image path to save the chart instead of showing it
+    use_views (bool): Read the stored summary table when it is fresh. Only for the
+    DataFrame the views were built from, unchanged since (see build_materialized_views)
     
     Returns:
     Dict containing year-over-year listening insights
     """
-    # Yearly metrics
-    yearly_metrics = df.groupby('year').agg({
-        'ms_played': 'sum',  # Total listening time
-        'track_name': 'count',  # Total tracks played
-        'artist_name': 'nunique',  # Unique artists
-        'skipped': 'mean'  # Average skip rate
-    })
+    # Stored summary table, when asked for and up to date
+    results = load_view(df, 'year_over_year_changes') if use_views else None
+    if results is None:
+        # Yearly metrics
+        yearly_metrics = df.groupby('year').agg({
+            'ms_played': 'sum',  # Total listening time
+            'track_name': 'count',  # Total tracks played
+            'artist_name': 'nunique',  # Unique artists
+            'skipped': 'mean'  # Average skip rate
+        })
+    
+        # Convert listening time to minutes
+        yearly_metrics['listening_time_minutes'] = yearly_metrics['ms_played'] / MS_TO_MINUTES
+    
+        # Calculate year-over-year changes
+        yearly_changes = yearly_metrics.pct_change() * 100
+        yearly_changes.columns = [f'{col}_change_percent' for col in yearly_changes.columns]
+    
+        results = {
+            'yearly_metrics': yearly_metrics,
+            'yearly_changes': yearly_changes
+        }
     
-    # Convert listening time to minutes
-    yearly_metrics['listening_time_minutes'] = yearly_metrics['ms_played'] / MS_TO_MINUTES
+    # Visualization
+    if plot:
+        plot_year_over_year_changes(results, output_path)
     
-    # Calculate year-over-year changes
-    yearly_changes = yearly_metrics.pct_change() * 100
-    yearly_changes.columns = [f'{col}_change_percent' for col in yearly_changes.columns]
+    return results
+
+def plot_year_over_year_changes(yoy_insights, output_path=None):
+    """
+    Plot the yearly listening time and number of unique artists.
     
-    # Visualization
-    plt.figure(figsize=(15, 5))
+    Parameters:
+    yoy_insights (dict): Output of analyze_year_over_year_changes
+    output_path (str): Optional image path to save the chart instead of showing it
+    """
+    yearly_metrics = yoy_insights['yearly_metrics']
+    
+    fig, (time_ax, artist_ax) = get_figure('year_over_year_changes', ncols=2, figsize=(15, 5),
+                                           output_path=output_path)
     
     # Listening time trend
-    plt.subplot(1, 2, 1)
-    yearly_metrics['listening_time_minutes'].plot(kind='line', marker='o')
-    plt.title('Yearly Listening Time')
-    plt.xlabel('Year')
-    plt.ylabel('Total Listening Time (Minutes)')
+    line_chart(time_ax, yearly_metrics['listening_time_minutes'], 'Yearly Listening Time',
+               'Year', 'Total Listening Time (Minutes)')
     
     # Unique artists trend
-    plt.subplot(1, 2, 2)
-    yearly_metrics['artist_name'].plot(kind='line', marker='o')
-    plt.title('Unique Artists per Year')
-    plt.xlabel('Year')
-    plt.ylabel('Number of Unique Artists')
-    
-    plt.tight_layout()
-    plt.show()
-    
-    return {
-        'yearly_metrics': yearly_metrics,
-        'yearly_changes': yearly_changes
-    }
+    line_chart(artist_ax, yearly_metrics['artist_name'], 'Unique Artists per Year',
+               'Year', 'Number of Unique Artists')
     
+    render_figure(fig, output_path)
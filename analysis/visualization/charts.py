@@ -0,0 +1,148 @@
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+
+# Constants
+OTHER_LABEL = 'Other'
+
+# Off-screen figures, kept by chart name so they can be reused
+_offscreen_figures = {}
+# Colorbar of each heatmap axes, updated rather than added again on reuse
+_colorbars = {}
+
+
+# Category capping
+def limit_categories(series, top_n=10, other_label=OTHER_LABEL):
+    """
+    Keep the top N categories of an aggregated series and fold the rest into one bucket.
+
+    Parameters:
+    series (pandas.Series): Aggregated values indexed by category
+    top_n (int): Number of categories to keep (None keeps everything)
+    other_label (str): Label of the bucket holding the remaining categories,
+    pass None to simply drop them (useful for rates, which can not be summed)
+
+    Returns:
+    pandas.Series: At most top_n categories, plus the "other" bucket when needed
+    """
+    if top_n is None or len(series) <= top_n:
+        return series
+
+    top_values = series.nlargest(top_n)
+    if other_label is None:
+        return top_values
+
+    other_value = series.sum() - top_values.sum()
+    other = pd.Series([other_value], index=[other_label], name=series.name)
+    return pd.concat([top_values, other])
+
+# Figure reuse
+def get_figure(name, ncols=1, figsize=(12, 5), output_path=None):
+    """
+    Return a figure and its axes for a chart, reusing them across calls.
+
+    Parameters:
+    name (str): Unique name of the chart, used as the pyplot figure number
+    ncols (int): Number of side by side axes
+    figsize (tuple): Figure size in inches
+    output_path (str): When given, the figure is created off-screen (no GUI needed)
+
+    Returns:
+    Tuple of the matplotlib Figure and a list of cleared Axes
+    """
+    if output_path is None:
+        # pyplot keeps figures by number and creates a new one only if it was closed
+        fig = plt.figure(num=name, figsize=figsize)
+    else:
+        fig = _offscreen_figures.get(name)
+        if fig is None:
+            fig = _offscreen_figures[name] = Figure(figsize=figsize)
+    # Colorbar axes belong to the chart axes they describe, and are not counted
+    colorbar_axes = [colorbar.ax for colorbar in _colorbars.values()]
+    chart_axes = [ax for ax in fig.axes if ax not in colorbar_axes]
+    if len(chart_axes) == ncols:
+        for ax in chart_axes:
+            ax.clear()
+    else:
+        for ax in chart_axes:
+            _colorbars.pop(ax, None)
+        fig.clear()
+        chart_axes = list(fig.subplots(1, ncols, squeeze=False)[0])
+        fig.set_layout_engine('constrained')
+    fig.set_size_inches(figsize)
+    return fig, chart_axes
+
+# Bar chart from an aggregated series
+def bar_chart(ax, series, title, xlabel, ylabel, rotation=0, ha='center', fontsize=None):
+    """
+    Draw an already aggregated series as a bar chart.
+
+    Parameters:
+    ax (matplotlib.axes.Axes): Axes to draw on
+    series (pandas.Series): Values to plot, indexed by category
+    title, xlabel, ylabel (str): Chart labels
+    rotation (int): Rotation of the x tick labels
+    ha (str): Horizontal alignment of the x tick labels
+    fontsize (int): Optional font size of the title and axis labels
+    """
+    positions = np.arange(len(series))
+    ax.bar(positions, series.to_numpy(dtype=float))
+    ax.set_xticks(positions, [str(label) for label in series.index], rotation=rotation, ha=ha)
+    ax.set_title(title, fontsize=fontsize)
+    ax.set_xlabel(xlabel, fontsize=fontsize)
+    ax.set_ylabel(ylabel, fontsize=fontsize)
+    ax.grid(True, axis='y', linestyle='--', alpha=0.3)
+
+# Line chart from an aggregated series
+def line_chart(ax, series, title, xlabel, ylabel):
+    """
+    Draw an already aggregated series as a line chart with markers.
+
+    Parameters:
+    ax (matplotlib.axes.Axes): Axes to draw on
+    series (pandas.Series): Values to plot, indexed by the x values
+    title, xlabel, ylabel (str): Chart labels
+    """
+    ax.plot(series.index.to_numpy(), series.to_numpy(dtype=float), marker='o')
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(True, linestyle='--', alpha=0.3)
+
+# Heatmap from a table
+def heatmap_chart(ax, frame, title, xlabel, ylabel):
+    """
+    Draw a table of values (for example transition probabilities) as a heatmap.
+
+    Parameters:
+    ax (matplotlib.axes.Axes): Axes to draw on
+    frame (pandas.DataFrame): Values to plot, rows on the y axis and columns on the x axis
+    title, xlabel, ylabel (str): Chart labels
+    """
+    image = ax.imshow(frame.to_numpy(dtype=float), aspect='auto', cmap='viridis')
+    ax.set_xticks(np.arange(frame.shape[1]), [str(label) for label in frame.columns],
+                  rotation=45, ha='right')
+    ax.set_yticks(np.arange(frame.shape[0]), [str(label) for label in frame.index])
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    colorbar = _colorbars.get(ax)
+    if colorbar is None:
+        _colorbars[ax] = ax.figure.colorbar(image, ax=ax)
+    else:
+        colorbar.update_normal(image)
+
+# Showing or saving a figure
+def render_figure(fig, output_path=None):
+    """
+    Show a figure on screen, or save it to a file without opening a window.
+
+    Parameters:
+    fig (matplotlib.figure.Figure): Figure to render
+    output_path (str): Optional image path, when given nothing is shown on screen
+    """
+    if output_path is None:
+        plt.show()
+    else:
+        fig.savefig(output_path)
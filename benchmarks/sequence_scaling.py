@@ -0,0 +1,78 @@
+# Benchmark of the play sequence transitions on synthetic listening histories
+#
+# Run from the repository root:
+#   python -m benchmarks.sequence_scaling
+#   python -m benchmarks.sequence_scaling --sizes 1000000 10000000 30000000
+#
+# The time per play should stay roughly constant as the number of plays grows,
+# with naive timestamps as well as timezone aware ones (raw exports, "...Z").
+
+import argparse
+import time
+
+import pandas as pd
+import numpy as np
+
+from analysis.interaction_patterns.sequences import analyze_play_transitions
+
+# Constants
+DEFAULT_SIZES = [1_000_000, 2_000_000, 5_000_000, 10_000_000]
+N_ARTISTS = 20_000
+REASONS_START = ['trackdone', 'fwdbtn', 'clickrow', 'backbtn', 'playbtn', 'remote']
+REASONS_END = ['trackdone', 'fwdbtn', 'endplay', 'backbtn', 'logout', 'remote']
+PLATFORMS = ['android', 'iOS', 'windows', 'mac', 'web player', 'cast to device']
+
+
+def make_history(n_plays, seed=0, timezone_aware=False):
+    """
+    Build a synthetic listening history with categorical columns.
+
+    Parameters:
+    n_plays (int): Number of plays
+    seed (int): Seed of the random generator
+    timezone_aware (bool): Whether ts holds UTC timezone aware timestamps
+
+    Returns:
+    pandas.DataFrame: Plays with ts, artist_name, reason_start, reason_end and platform
+    """
+    rng = np.random.default_rng(seed)
+    artists = [f'artist {i}' for i in range(N_ARTISTS)]
+    start = np.datetime64('2013-01-01T00:00:00', 's')
+    ten_years = 10 * 365 * 24 * 3600
+
+    timestamps = pd.Series(start + rng.integers(0, ten_years, n_plays).astype('timedelta64[s]'))
+    if timezone_aware:
+        timestamps = timestamps.dt.tz_localize('UTC')
+
+    return pd.DataFrame({
+        'ts': timestamps,
+        'artist_name': pd.Categorical.from_codes(
+            rng.zipf(1.3, n_plays) % N_ARTISTS, categories=artists),
+        'reason_start': pd.Categorical.from_codes(
+            rng.integers(0, len(REASONS_START), n_plays), categories=REASONS_START),
+        'reason_end': pd.Categorical.from_codes(
+            rng.integers(0, len(REASONS_END), n_plays), categories=REASONS_END),
+        'platform': pd.Categorical.from_codes(
+            rng.integers(0, len(PLATFORMS), n_plays), categories=PLATFORMS),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the play sequence transitions')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Numbers of plays to benchmark')
+    args = parser.parse_args()
+
+    print(f"{'plays':>12} {'ts':>6} {'seconds':>10} {'ns/play':>10}")
+    for n_plays in args.sizes:
+        for timezone_aware in (False, True):
+            df = make_history(n_plays, timezone_aware=timezone_aware)
+            start = time.perf_counter()
+            analyze_play_transitions(df, plot=False)
+            elapsed = time.perf_counter() - start
+            ts_kind = 'utc' if timezone_aware else 'naive'
+            print(f'{n_plays:>12,} {ts_kind:>6} {elapsed:>10.2f} {elapsed / n_plays * 1e9:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,13 +5,40 @@ import pandas as pd
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
+from functools import lru_cache
+
+# Constants
+DEFAULT_TIMEZONE = 'UTC'
+# Timezone offsets only change on quarter hours, so one offset per quarter hour is exact
+OFFSET_STEP_NS = 15 * 60 * 10**9
+# Timezone of each export country (conn_country), the most populated one for countries with several
+COUNTRY_TIMEZONES = {
+    'AR': 'America/Argentina/Buenos_Aires', 'AT': 'Europe/Vienna', 'AU': 'Australia/Sydney',
+    'BE': 'Europe/Brussels', 'BR': 'America/Sao_Paulo', 'CA': 'America/Toronto',
+    'CH': 'Europe/Zurich', 'CL': 'America/Santiago', 'CO': 'America/Bogota',
+    'CZ': 'Europe/Prague', 'DE': 'Europe/Berlin', 'DK': 'Europe/Copenhagen',
+    'EG': 'Africa/Cairo', 'ES': 'Europe/Madrid', 'FI': 'Europe/Helsinki',
+    'FR': 'Europe/Paris', 'GB': 'Europe/London', 'GR': 'Europe/Athens',
+    'HK': 'Asia/Hong_Kong', 'HU': 'Europe/Budapest', 'ID': 'Asia/Jakarta',
+    'IE': 'Europe/Dublin', 'IL': 'Asia/Jerusalem', 'IN': 'Asia/Kolkata',
+    'IT': 'Europe/Rome', 'JP': 'Asia/Tokyo', 'KR': 'Asia/Seoul',
+    'MA': 'Africa/Casablanca', 'MX': 'America/Mexico_City', 'MY': 'Asia/Kuala_Lumpur',
+    'NG': 'Africa/Lagos', 'NL': 'Europe/Amsterdam', 'NO': 'Europe/Oslo',
+    'NZ': 'Pacific/Auckland', 'PE': 'America/Lima', 'PH': 'Asia/Manila',
+    'PL': 'Europe/Warsaw', 'PT': 'Europe/Lisbon', 'RO': 'Europe/Bucharest',
+    'SA': 'Asia/Riyadh', 'SE': 'Europe/Stockholm', 'SG': 'Asia/Singapore',
+    'TH': 'Asia/Bangkok', 'TR': 'Europe/Istanbul', 'TW': 'Asia/Taipei',
+    'UA': 'Europe/Kyiv', 'US': 'America/New_York', 'VN': 'Asia/Ho_Chi_Minh',
+    'ZA': 'Africa/Johannesburg',
+}
 
 
 # Function to get csv data
-def get_csv_data():
-    csv_filename = "data/csv/spotify_history.csv"
+def get_csv_data(csv_filename="data/csv/spotify_history.csv"):
     try:
         df = pd.read_csv(csv_filename)
+        # Remembering the source, to match the dataset with its materialized views
+        df.attrs['source_path'] = csv_filename
     except FileNotFoundError:
         print(f"File {csv_filename} not found.")
         df = None
@@ -60,9 +87,81 @@ def information_dataset(df):
             'total_missing_values':total_missing_values, 
             'data_types':data_types}
 
-def columns_for_analysis(df):
+# UTC offset of every quarter hour in a range, cached per timezone and range
+@lru_cache(maxsize=32)
+def _utc_offsets(timezone, first_step, last_step):
+    steps_utc = np.arange(first_step, last_step + 1, dtype=np.int64) * OFFSET_STEP_NS
+    steps_local = (pd.DatetimeIndex(steps_utc.view('datetime64[ns]'), tz='UTC')
+                   .tz_convert(timezone).tz_localize(None))
+    offsets = steps_local.asi8 - steps_utc
+    offsets.flags.writeable = False
+    return offsets
+
+def to_local_time(utc_ns, timezone):
+    """
+    Convert UTC timestamps to the local time of a timezone.
+
+    The offset of each quarter hour of the covered range is computed once
+    (and cached), then every timestamp picks its offset with an array lookup.
+
+    Parameters:
+    utc_ns (numpy.ndarray): UTC timestamps as int64 nanoseconds
+    timezone (str): IANA timezone name, for example 'Europe/Paris'
+
+    Returns:
+    numpy.ndarray: Local wall clock times as int64 nanoseconds
+    """
+    if len(utc_ns) == 0 or timezone == DEFAULT_TIMEZONE:
+        return utc_ns
+    steps = utc_ns // OFFSET_STEP_NS
+    first_step = int(steps.min())
+    offsets = _utc_offsets(timezone, first_step, int(steps.max()))
+    return utc_ns + offsets[steps - first_step]
+
+def _row_timezones(df, timezone):
+    # Timezone of each row: the one given, or the one of the connection country
+    if timezone is not None or 'conn_country' not in df.columns:
+        return [timezone or DEFAULT_TIMEZONE], np.zeros(len(df), dtype=np.intp)
+    country_codes, countries = pd.factorize(df['conn_country'])
+    timezones, timezone_of_country = np.unique(
+        [COUNTRY_TIMEZONES.get(country, DEFAULT_TIMEZONE) for country in countries] + [DEFAULT_TIMEZONE],
+        return_inverse=True)
+    # Missing countries (code -1) pick the trailing default timezone
+    return list(timezones), timezone_of_country[country_codes]
+
+def columns_for_analysis(df, timezone=None):
+    """
+    Add the local time columns used by the analyses.
+
+    Spotify exports their timestamps in UTC, so ts is converted to local time
+    before the hour, day, weekday, month and year are extracted.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data
+    timezone (str): IANA timezone of the user, for example 'Europe/Paris'.
+    When not given, each play uses the timezone of its conn_country column
+    if the export has one, and UTC otherwise.
+    """
     df['ts'] = pd.to_datetime(df['ts'])
-    df['hour'] = df['ts'].dt.hour
-    df['day'] = df['ts'].dt.day
-    df['month'] = df['ts'].dt.month
-    df['year'] = df['ts'].dt.year
+    utc_ts = df['ts']
+    if utc_ts.dt.tz is not None:
+        utc_ts = utc_ts.dt.tz_convert('UTC').dt.tz_localize(None)
+    utc_ns = utc_ts.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+    timezones, row_timezones = _row_timezones(df, timezone)
+    valid = ~np.isnat(utc_ts.to_numpy(dtype='datetime64[ns]'))
+    local_ns = utc_ns.copy()
+    for position, zone in enumerate(timezones):
+        rows = valid & (row_timezones == position) if len(timezones) > 1 else valid
+        local_ns[rows] = to_local_time(utc_ns[rows], zone)
+
+    local_ts = pd.Series(local_ns.view('datetime64[ns]'), index=df.index)
+    df['local_ts'] = local_ts
+    df['hour'] = local_ts.dt.hour
+    df['day'] = local_ts.dt.day
+    df['weekday'] = local_ts.dt.dayofweek
+    df['month'] = local_ts.dt.month
+    df['year'] = local_ts.dt.year
+    # Remembering how the local time was derived, to match the materialized views
+    df.attrs['timezone'] = timezone if timezone is not None else (
+        'conn_country' if 'conn_country' in df.columns else DEFAULT_TIMEZONE)
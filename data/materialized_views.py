@@ -0,0 +1,168 @@
+# Materialized views
+
+# Importing packages/libraries
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# Constants
+# Bump when the content of a view changes, so stored views get rebuilt
+VIEWS_VERSION = 3
+VIEWS_FOLDER = 'views'
+
+# Views loaded from disk, kept by source path and preparation
+_loaded_views = {}
+_lock = threading.Lock()
+
+
+def _views_paths(source_path, preparation=None):
+    # Views are stored in a folder next to the dataset they summarize, one set
+    # per preparation so the menus and the pipeline do not overwrite each other
+    folder = os.path.join(os.path.dirname(source_path), VIEWS_FOLDER)
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    if preparation is not None:
+        name = f'{name}.{preparation[:16]}'
+    return (os.path.join(folder, f'{name}.views.json'),
+            os.path.join(folder, f'{name}.views.pkl'))
+
+def _source_signature(source_path):
+    stat = os.stat(source_path)
+    return {'path': source_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _expected_metadata(df):
+    # What the metadata of fresh views must contain for this DataFrame
+    source_path = df.attrs.get('source_path')
+    if source_path is None or not os.path.exists(source_path):
+        return None
+    return {
+        'version': VIEWS_VERSION,
+        'source': _source_signature(source_path),
+        'rows': len(df),
+        'timezone': df.attrs.get('timezone'),
+        # Set by the pipeline runner from its cleaning and derived steps
+        'preparation': df.attrs.get('preparation')
+    }
+
+def _is_fresh(metadata, expected):
+    return all(metadata.get(key) == value for key, value in expected.items())
+
+# Function to get a stored view
+def load_view(df, name):
+    """
+    Return a stored summary table of the dataset, if it is up to date.
+
+    Views are fresh when they were built with the current VIEWS_VERSION,
+    from the same source file (size and modification time), the same number
+    of rows, the same timezone and the same pipeline preparation. The content
+    of df is not checked: only call this for the DataFrame the views were
+    built from, unchanged since.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data, as loaded by get_csv_data
+    name (str): Name of the view
+
+    Returns:
+    The stored analysis output, or None when it is missing or stale
+    """
+    expected = _expected_metadata(df)
+    if expected is None:
+        return None
+
+    slot = (expected['source']['path'], expected['preparation'])
+    with _lock:
+        cached = _loaded_views.get(slot)
+    if cached is None or not _is_fresh(cached['metadata'], expected):
+        metadata_path, views_path = _views_paths(*slot)
+        try:
+            with open(metadata_path) as metadata_file:
+                metadata = json.load(metadata_file)
+            if not _is_fresh(metadata, expected):
+                return None
+            cached = {'metadata': metadata, 'views': pd.read_pickle(views_path)}
+        except (OSError, ValueError, EOFError):
+            return None
+        with _lock:
+            _loaded_views[slot] = cached
+
+    return cached['views'].get(name)
+
+# Function to check the stored views
+def views_are_fresh(df):
+    """
+    Check whether the stored views match the dataset.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data, as loaded by get_csv_data
+
+    Returns:
+    bool: True when every view can be used instead of the raw data
+    """
+    return load_view(df, 'artist_listening_time') is not None
+
+# Function to build and store the views
+def build_materialized_views(df):
+    """
+    Compute the daily summary tables and store them next to the dataset.
+
+    The views hold the outputs of calculate_artist_listening_time,
+    analyze_hourly_listening, analyze_year_over_year_changes,
+    analyze_platform_usage and analyze_shuffle_listening, which read them
+    back when called with use_views=True. Views are stored separately for
+    each preparation (see the pipeline runner), so the menus and the pipeline
+    keep their own. Nothing is done when the stored views are already fresh. Build them from the final DataFrame: changes
+    made to it afterwards are not detected.
+
+    Parameters:
+    df (pandas.DataFrame): Spotify listening data, with the columns added by columns_for_analysis
+
+    Returns:
+    bool: True when the views are fresh once done
+    """
+    expected = _expected_metadata(df)
+    if expected is None:
+        print("Views not built: the dataset was not loaded from a file.")
+        return False
+    if views_are_fresh(df):
+        return True
+
+    # Imported here, the analysis modules read the views from this module
+    from analysis.interaction_patterns.interaction import analyze_shuffle_listening
+    from analysis.listening_behavior.listening import (
+        calculate_artist_listening_time,
+        analyze_platform_usage,
+    )
+    from analysis.temporal_trends.temporal import (
+        analyze_hourly_listening,
+        analyze_year_over_year_changes,
+    )
+
+    # Analyses read the raw data unless asked for the views (use_views)
+    views = {
+        'artist_listening_time': calculate_artist_listening_time(df),
+        'hourly_listening': analyze_hourly_listening(df, plot=False),
+        'year_over_year_changes': analyze_year_over_year_changes(df, plot=False),
+        'platform_usage': analyze_platform_usage(df, plot=False),
+        'shuffle_listening': analyze_shuffle_listening(df, plot=False)
+    }
+    metadata = dict(expected,
+                    created_at=datetime.now(timezone.utc).isoformat(),
+                    views=sorted(views))
+
+    slot = (expected['source']['path'], expected['preparation'])
+    metadata_path, views_path = _views_paths(*slot)
+    try:
+        os.makedirs(os.path.dirname(views_path), exist_ok=True)
+        pd.to_pickle(views, views_path)
+        # Metadata is written last, so views are never fresh while half written
+        with open(metadata_path, 'w') as metadata_file:
+            json.dump(metadata, metadata_file, indent=2)
+    except OSError as error:
+        print(f"Views could not be saved: {error}")
+        return False
+
+    with _lock:
+        _loaded_views[slot] = {'metadata': metadata, 'views': views}
+    return True
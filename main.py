@@ -1,6 +1,7 @@
 # Main
 
 # Importing Packages/libraries
+import os
 import pandas as pd
 import numpy as np
 import seaborn as sns
@@ -15,23 +16,46 @@ from data.data_manipulation import (
     information_dataset,
     columns_for_analysis,
 )
+from data.materialized_views import build_materialized_views
 from analysis.interaction_patterns.interaction import (
     analyze_shuffle_listening,
+    plot_shuffle_listening,
     analyze_track_start_end_reasons,
+    plot_track_start_end_reasons,
+)
+from analysis.interaction_patterns.sequences import (
+    analyze_play_transitions,
+    plot_play_transitions,
 )
 from analysis.listening_behavior.listening import (
     calculate_artist_listening_time,
     plot_artist_listening_time,
     analyze_peak_listening_times,
+    plot_peak_listening_times,
     analyze_most_played_artists,
+    plot_most_played_artists,
     analyze_skip_rates,
+    plot_skip_rates,
     analyze_platform_usage,
+    plot_platform_usage,
 )
 from analysis.temporal_trends.temporal import (
     analyze_listening_patterns,
+    plot_listening_patterns,
     analyze_hourly_listening,
+    plot_hourly_listening,
     analyze_year_over_year_changes,
+    plot_year_over_year_changes,
+)
+from analysis.engagement.engagement import (
+    analyze_engagement,
+    plot_engagement,
 )
+from tasks.executor import AnalysisExecutor
+
+# Timezone used for the hour/day of each play (for example "Europe/Paris"),
+# inferred from the conn_country column of the export when not set
+USER_TIMEZONE = os.environ.get("SPOTIFY_TIMEZONE")
 
 # Loading the dataset and making copy
 original_spotify_df = get_csv_data()
@@ -56,6 +80,35 @@ def print_welcome_message():
 print_welcome_message()
 
 
+# Analyses run in the background so the menus never wait for them
+executor = AnalysisExecutor()
+
+# Function drawing the results of each analysis once they are collected
+renderers = {}
+
+# Snapshot of the dataset with the analysis columns, shared by the background jobs.
+# It is built once and never changed afterwards, since jobs may be reading it.
+analysis_df = None
+
+
+def run_analysis(name, analysis, renderer, **kwargs):
+    renderers[name] = renderer
+    handle = executor.submit(name, analysis, analysis_df, key=name, **kwargs)
+    print(f"Job #{handle.job_id} '{name}' submitted.")
+    print("Collect the results from Analyze Menu > Background jobs.")
+
+
+def prefetch_analysis(name, analysis, **kwargs):
+    executor.prefetch(name, analysis, analysis_df, **kwargs)
+
+
+def print_jobs_summary():
+    jobs = executor.jobs()
+    if jobs:
+        ready = sum(handle.done() for handle in jobs)
+        print(f"\n[{len(jobs) - ready} job(s) running, {ready} ready to collect]")
+
+
 # Defining menu functions
 def explore_menu():
     while True:
@@ -109,13 +162,20 @@ def explore_menu():
 
 
 def analyze_menu():
-    columns_for_analysis(spotify_df)
+    global analysis_df
+    if analysis_df is None:
+        analysis_df = spotify_df.copy()
+        columns_for_analysis(analysis_df, timezone=USER_TIMEZONE)
+    # Refreshing the stored summary tables in the background when they are stale
+    executor.prefetch("Materialized views", build_materialized_views, analysis_df)
     while True:
+        print_jobs_summary()
         print("\nAnalyze Menu:")
         print("1. Listening behavior")
         print("2. Temporal trends")
         print("3. Interaction patterns")
-        print("4. Back to Main Menu\n")
+        print("4. Background jobs")
+        print("5. Back to Main Menu\n")
 
         choice = input("Enter your choice: ")
 
@@ -126,46 +186,89 @@ def analyze_menu():
         elif choice == "3":
             interaction_patterns_menu()
         elif choice == "4":
+            background_jobs_menu()
+        elif choice == "5":
             break
         else:
             print("Invalid choice. Please try again.")
 
 
 def listening_behavior_menu():
+    # Warming the artist totals, the first entry of this menu
+    prefetch_analysis(
+        "Total listening time by artist", calculate_artist_listening_time, use_views=True
+    )
     while True:
+        print_jobs_summary()
         print("\nListening behavior Menu:")
         print("1. Total listening time by artist")
         print("2. Peak listening hours and days")
         print("3. Most played tracks/artist")
         print("4. Skip rate insight")
         print("5. platform usage distribution")
-        print("6. Back to Analyze Menu\n")
+        print("6. Track completion and true skips")
+        print("7. Back to Analyze Menu\n")
 
         choice = input("Enter your choice: ")
 
         if choice == "1":
-            # Getting Total listening time by artist
-            total_listening_time_per_artist = calculate_artist_listening_time(
-                spotify_df
+            # Getting Total listening time by artist and visualizing the top 10 artists
+            run_analysis(
+                "Total listening time by artist",
+                calculate_artist_listening_time,
+                lambda result: plot_artist_listening_time(result, top_n=10),
+                use_views=True,
             )
-            # Visualizing the top 10 artist with the most listening time ()
-            plot_artist_listening_time(total_listening_time_per_artist, top_n=10)
         elif choice == "2":
-            peak_times = analyze_peak_listening_times(spotify_df)
+            run_analysis(
+                "Peak listening hours and days",
+                analyze_peak_listening_times,
+                plot_peak_listening_times,
+                plot=False,
+            )
         elif choice == "3":
-            most_played = analyze_most_played_artists(spotify_df, top_n=10)
+            run_analysis(
+                "Most played tracks/artist",
+                analyze_most_played_artists,
+                plot_most_played_artists,
+                top_n=10,
+                plot=False,
+            )
         elif choice == "4":
-            skip_insights = analyze_skip_rates(spotify_df)
+            run_analysis(
+                "Skip rate insight", analyze_skip_rates, plot_skip_rates, plot=False
+            )
         elif choice == "5":
-            platform_insights = analyze_platform_usage(spotify_df)
+            run_analysis(
+                "Platform usage distribution",
+                analyze_platform_usage,
+                plot_platform_usage,
+                plot=False,
+                use_views=True,
+            )
         elif choice == "6":
+            run_analysis(
+                "Track completion and true skips",
+                analyze_engagement,
+                plot_engagement,
+                plot=False,
+            )
+        elif choice == "7":
             break
         else:
             print("Invalid choice. Please try again.")
 
 
 def temporal_trends_menu():
+    # Warming the hourly aggregates, the most requested temporal analysis
+    prefetch_analysis(
+        "Hour of day listening frequency",
+        analyze_hourly_listening,
+        plot=False,
+        use_views=True,
+    )
     while True:
+        print_jobs_summary()
         print("\nTemporal trends Menu:")
         print("1. Monthly/yearly listening patterns")
         print("2. Hour of day listening frequency")
@@ -175,11 +278,28 @@ def temporal_trends_menu():
         choice = input("Enter your choice: ")
 
         if choice == "1":
-            listening_patterns = analyze_listening_patterns(spotify_df)
+            run_analysis(
+                "Monthly/yearly listening patterns",
+                analyze_listening_patterns,
+                plot_listening_patterns,
+                plot=False,
+            )
         elif choice == "2":
-            hourly_insights = analyze_hourly_listening(spotify_df)
+            run_analysis(
+                "Hour of day listening frequency",
+                analyze_hourly_listening,
+                plot_hourly_listening,
+                plot=False,
+                use_views=True,
+            )
         elif choice == "3":
-            yoy_insights = analyze_year_over_year_changes(spotify_df)
+            run_analysis(
+                "Year-over-year listening behavior changes",
+                analyze_year_over_year_changes,
+                plot_year_over_year_changes,
+                plot=False,
+                use_views=True,
+            )
         elif choice == "4":
             break
         else:
@@ -188,18 +308,96 @@ def temporal_trends_menu():
 
 def interaction_patterns_menu():
     while True:
+        print_jobs_summary()
         print("\nInteraction patterns Menu:")
         print("1. Shuffle vs non-shuffle listening")
         print("2. Reason for track start/end")
-        print("3. Back to Analyze Menu\n")
+        print("3. Play sequence transitions")
+        print("4. Back to Analyze Menu\n")
 
         choice = input("Enter your choice: ")
 
         if choice == "1":
-            shuffle_insights = analyze_shuffle_listening(spotify_df)
+            run_analysis(
+                "Shuffle vs non-shuffle listening",
+                analyze_shuffle_listening,
+                plot_shuffle_listening,
+                plot=False,
+                use_views=True,
+            )
         elif choice == "2":
-            track_reason_insights = analyze_track_start_end_reasons(spotify_df)
+            run_analysis(
+                "Reason for track start/end",
+                analyze_track_start_end_reasons,
+                plot_track_start_end_reasons,
+                plot=False,
+            )
         elif choice == "3":
+            run_analysis(
+                "Play sequence transitions",
+                analyze_play_transitions,
+                plot_play_transitions,
+                plot=False,
+            )
+        elif choice == "4":
+            break
+        else:
+            print("Invalid choice. Please try again.")
+
+
+def background_jobs_menu():
+    while True:
+        print_jobs_summary()
+        print("\nBackground jobs Menu:")
+        print("1. Show job progress")
+        print("2. Collect finished results")
+        print("3. Cancel a job")
+        print("4. Back to Analyze Menu\n")
+
+        choice = input("Enter your choice: ")
+
+        if choice == "1":
+            jobs = executor.jobs()
+            if not jobs:
+                print("No background jobs.")
+            for handle in jobs:
+                print(
+                    f"#{handle.job_id} {handle.name}: {handle.status()} "
+                    f"({handle.elapsed():.1f}s)"
+                )
+        elif choice == "2":
+            ready = executor.collect_ready()
+            if not ready:
+                print("No finished jobs yet.")
+            for handle in ready:
+                if handle.status() == "failed":
+                    error = handle.future.exception()
+                    print(f"Job #{handle.job_id} '{handle.name}' failed: {error}")
+                    continue
+                try:
+                    renderers[handle.name](handle.result())
+                except Exception as error:
+                    print(f"Job #{handle.job_id} '{handle.name}' failed: {error}")
+        elif choice == "3":
+            try:
+                job_id = int(input("\nJob number to cancel: "))
+            except ValueError:
+                print("Invalid input. Please enter a number.")
+                continue
+            handle = executor.get(job_id)
+            if handle is None:
+                print(f"No job #{job_id}.")
+            elif handle.cancel():
+                print(f"Job #{job_id} cancelled.")
+            elif handle.status() == "running":
+                handle.discard()
+                print(
+                    f"Job #{job_id} is already running: it will finish in the "
+                    "background and its result will be discarded."
+                )
+            else:
+                print(f"Job #{job_id} already finished.")
+        elif choice == "4":
             break
         else:
             print("Invalid choice. Please try again.")
@@ -225,6 +423,10 @@ def main_menu():
                 analyze_menu()
         elif choice == "3":
             print("Exiting...")
+            running = [handle for handle in executor.jobs() if not handle.done()]
+            if running:
+                print(f"{len(running)} unfinished job(s) abandoned.")
+            executor.shutdown()
             break
         else:
             print("Invalid choice. Please try again.")
@@ -0,0 +1,388 @@
+# Pipeline runner
+
+# Importing packages/libraries
+import argparse
+import hashlib
+import json
+import os
+import tomllib
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+
+import pandas as pd
+
+# Importing custom functions
+from data.data_manipulation import (
+    get_csv_data,
+    fill_missing_values,
+    columns_for_analysis,
+)
+from data.materialized_views import build_materialized_views
+from analysis.engagement.engagement import (
+    analyze_engagement,
+    plot_engagement,
+)
+from analysis.interaction_patterns.interaction import (
+    analyze_shuffle_listening,
+    plot_shuffle_listening,
+    analyze_track_start_end_reasons,
+    plot_track_start_end_reasons,
+)
+from analysis.interaction_patterns.sequences import (
+    analyze_play_transitions,
+    plot_play_transitions,
+)
+from analysis.listening_behavior.listening import (
+    calculate_artist_listening_time,
+    plot_artist_listening_time,
+    analyze_peak_listening_times,
+    plot_peak_listening_times,
+    analyze_most_played_artists,
+    plot_most_played_artists,
+    analyze_skip_rates,
+    plot_skip_rates,
+    analyze_platform_usage,
+    plot_platform_usage,
+)
+from analysis.temporal_trends.temporal import (
+    analyze_listening_patterns,
+    plot_listening_patterns,
+    analyze_hourly_listening,
+    plot_hourly_listening,
+    analyze_year_over_year_changes,
+    plot_year_over_year_changes,
+)
+from tasks.executor import AnalysisExecutor
+
+# Constants
+DEFAULT_CONFIG = 'pipeline.toml'
+DEFAULT_OUTPUT_FOLDER = 'output'
+# Bump when the code of a step or an analysis changes its output,
+# so every stage and the cached dataset are rebuilt
+# 2: columns_for_analysis derives local time columns and adds weekday
+PIPELINE_VERSION = 2
+STATE_FILENAME = 'pipeline_state.json'
+DATASET_CACHE_FILENAME = 'dataset.pkl'
+
+# Cleaning and derived column steps, called with the DataFrame and the step parameters
+STEPS = {
+    'fill_missing_values': fill_missing_values,
+    'columns_for_analysis': columns_for_analysis,
+    'build_materialized_views': build_materialized_views,
+}
+
+# Analyses: function computing the results and function drawing them.
+# Analyses backed by a materialized view read it, since the pipeline builds it last
+ANALYSES = {
+    'calculate_artist_listening_time': (partial(calculate_artist_listening_time, use_views=True),
+                                        plot_artist_listening_time),
+    'analyze_peak_listening_times': (partial(analyze_peak_listening_times, plot=False), plot_peak_listening_times),
+    'analyze_most_played_artists': (partial(analyze_most_played_artists, plot=False), plot_most_played_artists),
+    'analyze_skip_rates': (partial(analyze_skip_rates, plot=False), plot_skip_rates),
+    'analyze_platform_usage': (partial(analyze_platform_usage, plot=False, use_views=True),
+                               plot_platform_usage),
+    'analyze_engagement': (partial(analyze_engagement, plot=False), plot_engagement),
+    'analyze_listening_patterns': (partial(analyze_listening_patterns, plot=False), plot_listening_patterns),
+    'analyze_hourly_listening': (partial(analyze_hourly_listening, plot=False, use_views=True),
+                                 plot_hourly_listening),
+    'analyze_year_over_year_changes': (partial(analyze_year_over_year_changes, plot=False, use_views=True),
+                                       plot_year_over_year_changes),
+    'analyze_shuffle_listening': (partial(analyze_shuffle_listening, plot=False, use_views=True),
+                                  plot_shuffle_listening),
+    'analyze_track_start_end_reasons': (partial(analyze_track_start_end_reasons, plot=False),
+                                        plot_track_start_end_reasons),
+    'analyze_play_transitions': (partial(analyze_play_transitions, plot=False), plot_play_transitions),
+}
+
+
+# Function to read the pipeline configuration
+def load_config(config_path):
+    """
+    Read a pipeline configuration file (TOML).
+
+    Parameters:
+    config_path (str): Path of the configuration file
+
+    Returns:
+    Dict with the source, cleaning, derived, analyses and output sections
+    """
+    with open(config_path, 'rb') as config_file:
+        return tomllib.load(config_file)
+
+def _fingerprint(*parts):
+    text = json.dumps([PIPELINE_VERSION, parts], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+# Function to build the dependency graph
+def build_stages(config):
+    """
+    Turn a pipeline configuration into stages with their dependencies.
+
+    The source, cleaning and derived stages form a chain, each one working on
+    the DataFrame of the previous one. Every analysis depends on the last of
+    them and on the analyses listed in its depends_on.
+
+    Parameters:
+    config (dict): Output of load_config
+
+    Returns:
+    Dict of stages by name, in dependency order
+    """
+    stages = {'source': {'kind': 'source', 'config': config['source'], 'depends_on': []}}
+
+    previous = 'source'
+    for kind in ('cleaning', 'derived'):
+        for position, step in enumerate(config.get(kind, [])):
+            if step['step'] not in STEPS:
+                raise ValueError(f"Unknown {kind} step: {step['step']}")
+            name = f"{kind}[{position}] {step['step']}"
+            stages[name] = {'kind': kind, 'config': step, 'depends_on': [previous]}
+            previous = name
+    dataset_stage = previous
+
+    # Views must summarize the final dataset, the analyses read them instead of it
+    derived_steps = [step['step'] for step in config.get('derived', [])]
+    if 'build_materialized_views' in derived_steps[:-1] or \
+            'build_materialized_views' in [step['step'] for step in config.get('cleaning', [])]:
+        raise ValueError("build_materialized_views must be the last derived step")
+
+    analyses = {}
+    for analysis in config.get('analyses', []):
+        if analysis['function'] not in ANALYSES:
+            raise ValueError(f"Unknown analysis function: {analysis['function']}")
+        name = analysis.get('name', analysis['function'])
+        if name in analyses:
+            raise ValueError(f"Duplicate analysis name: {name}")
+        depends_on = [dataset_stage] + list(analysis.get('depends_on', []))
+        analyses[name] = {'kind': 'analysis', 'config': analysis, 'depends_on': depends_on}
+
+    # Sorting the analyses so each one comes after its dependencies
+    ordered = {}
+    visiting = set()
+
+    def visit(name):
+        if name in ordered or name in stages:
+            return
+        if name not in analyses:
+            raise ValueError(f"Unknown dependency: {name}")
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through: {name}")
+        visiting.add(name)
+        for dependency in analyses[name]['depends_on']:
+            visit(dependency)
+        visiting.discard(name)
+        ordered[name] = analyses[name]
+
+    for name in analyses:
+        visit(name)
+
+    stages.update(ordered)
+    return stages
+
+def compute_fingerprints(stages):
+    """
+    Fingerprint every stage from its configuration and the fingerprints of its inputs.
+
+    The source fingerprint comes from the size and modification time of the file,
+    so a stage keeps the same fingerprint as long as nothing upstream changed.
+    Every fingerprint also includes PIPELINE_VERSION, which covers the code.
+
+    Parameters:
+    stages (dict): Output of build_stages
+
+    Returns:
+    Dict of fingerprints by stage name
+    """
+    fingerprints = {}
+    for name, stage in stages.items():
+        inputs = [fingerprints[dependency] for dependency in stage['depends_on']]
+        if stage['kind'] == 'source':
+            stat = os.stat(stage['config']['path'])
+            inputs.append([stat.st_size, stat.st_mtime_ns])
+        fingerprints[name] = _fingerprint(stage['config'], inputs)
+    return fingerprints
+
+def _read_state(state_path):
+    try:
+        with open(state_path) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+def _write_state(state_path, state):
+    with open(state_path, 'w') as state_file:
+        json.dump(state, state_file, indent=2)
+
+def _analysis_outputs(output_folder, name):
+    filename = name.replace('/', '_').replace(' ', '_')
+    return (os.path.join(output_folder, f'{filename}.pkl'),
+            os.path.join(output_folder, f'{filename}.png'))
+
+# Function to build the dataset
+def prepare_dataset(stages, fingerprints, output_folder):
+    """
+    Run the source, cleaning and derived stages, or reuse the cached dataset.
+
+    Parameters:
+    stages (dict): Output of build_stages
+    fingerprints (dict): Output of compute_fingerprints
+    output_folder (str): Folder holding the cached dataset
+
+    Returns:
+    pandas.DataFrame: The prepared dataset, or None when the source can not be read
+    """
+    data_stages = [name for name, stage in stages.items() if stage['kind'] != 'analysis']
+    dataset_fingerprint = fingerprints[data_stages[-1]]
+    cache_path = os.path.join(output_folder, DATASET_CACHE_FILENAME)
+    state = _read_state(os.path.join(output_folder, STATE_FILENAME))
+
+    # Nothing changed upstream: reusing the prepared dataset of the previous run
+    if state.get('dataset') == dataset_fingerprint and os.path.exists(cache_path):
+        print("Dataset unchanged, reusing the prepared dataset.")
+        return pd.read_pickle(cache_path)
+
+    df = None
+    for name in data_stages:
+        stage = stages[name]
+        print(f"Running {name}")
+        if stage['kind'] == 'source':
+            df = get_csv_data(stage['config']['path'])
+            if df is None:
+                return None
+            # Stored views are only fresh for a dataset prepared the same way
+            df.attrs['preparation'] = dataset_fingerprint
+        else:
+            params = {key: value for key, value in stage['config'].items() if key != 'step'}
+            result = STEPS[stage['config']['step']](df, **params)
+            # Steps either return the DataFrame or change it in place
+            if isinstance(result, pd.DataFrame):
+                df = result
+
+    df.to_pickle(cache_path)
+    state['dataset'] = dataset_fingerprint
+    _write_state(os.path.join(output_folder, STATE_FILENAME), state)
+    return df
+
+# Function to run a pipeline
+def run_pipeline(config_path=DEFAULT_CONFIG, force=False):
+    """
+    Run the stale stages of a pipeline.
+
+    Analyses whose fingerprint did not change since the last run, and whose
+    outputs still exist, are skipped. When every analysis is skipped the dataset
+    is not even loaded. The other analyses run concurrently, each one as soon as
+    its dependencies are done, and save their results (.pkl) and chart (.png)
+    in the output folder.
+
+    Parameters:
+    config_path (str): Path of the configuration file
+    force (bool): Run every stage, even the unchanged ones
+
+    Returns:
+    Dict with the names of the analyses run, skipped and failed
+    """
+    config = load_config(config_path)
+    output_folder = config.get('output', {}).get('folder', DEFAULT_OUTPUT_FOLDER)
+    os.makedirs(output_folder, exist_ok=True)
+    state_path = os.path.join(output_folder, STATE_FILENAME)
+
+    stages = build_stages(config)
+    try:
+        fingerprints = compute_fingerprints(stages)
+    except FileNotFoundError as error:
+        print(f"File {error.filename} not found.")
+        return None
+    state = {} if force else _read_state(state_path)
+    analyses = [name for name, stage in stages.items() if stage['kind'] == 'analysis']
+
+    def up_to_date(name):
+        return (state.get('analyses', {}).get(name) == fingerprints[name]
+                and all(os.path.exists(path) for path in _analysis_outputs(output_folder, name)))
+
+    summary = {
+        'run': [],
+        'skipped': [name for name in analyses if up_to_date(name)],
+        'failed': []
+    }
+    stale = [name for name in analyses if name not in summary['skipped']]
+    for name in summary['skipped']:
+        print(f"Skipping {name}: inputs unchanged")
+    if not stale:
+        return summary
+
+    if force:
+        state.pop('dataset', None)
+        _write_state(state_path, state)
+    df = prepare_dataset(stages, fingerprints, output_folder)
+    if df is None:
+        summary['failed'] = stale
+        return summary
+    state = _read_state(state_path)
+    state.setdefault('analyses', {})
+
+    # Running each stale analysis as soon as its dependencies are done
+    executor = AnalysisExecutor()
+    running = {}
+    pending = list(stale)
+    try:
+        while pending or running:
+            for name in list(pending):
+                dependencies = [dependency for dependency in stages[name]['depends_on'] if dependency in stages
+                                and stages[dependency]['kind'] == 'analysis']
+                if any(dependency in summary['failed'] for dependency in dependencies):
+                    print(f"Skipping {name}: a dependency failed")
+                    summary['failed'].append(name)
+                    pending.remove(name)
+                elif all(dependency not in pending and dependency not in running for dependency in dependencies):
+                    analysis = stages[name]['config']
+                    compute, _ = ANALYSES[analysis['function']]
+                    print(f"Running {name}")
+                    running[name] = executor.submit(name, compute, df, **analysis.get('params', {}))
+                    pending.remove(name)
+            if not running:
+                continue
+
+            wait([handle.future for handle in running.values()], return_when=FIRST_COMPLETED)
+            for name, handle in list(running.items()):
+                if not handle.done():
+                    continue
+                del running[name]
+                if handle.status() == 'failed':
+                    print(f"{name} failed: {handle.future.exception()}")
+                    summary['failed'].append(name)
+                    continue
+
+                # Charts are drawn off-screen from this thread, matplotlib is not thread safe
+                analysis = stages[name]['config']
+                _, render = ANALYSES[analysis['function']]
+                results_path, chart_path = _analysis_outputs(output_folder, name)
+                try:
+                    pd.to_pickle(handle.result(), results_path)
+                    render(handle.result(), output_path=chart_path, **analysis.get('plot_params', {}))
+                except Exception as error:
+                    print(f"{name} failed: {error}")
+                    summary['failed'].append(name)
+                    # Outputs may be half written, the next run must redo them
+                    if state['analyses'].pop(name, None) is not None:
+                        _write_state(state_path, state)
+                    continue
+
+                # Recorded only once both outputs are saved
+                state['analyses'][name] = fingerprints[name]
+                _write_state(state_path, state)
+                summary['run'].append(name)
+    finally:
+        executor.shutdown()
+
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the Spotify history analysis pipeline')
+    parser.add_argument('config', nargs='?', default=DEFAULT_CONFIG, help='Pipeline configuration (TOML)')
+    parser.add_argument('--force', action='store_true', help='Run every stage, even the unchanged ones')
+    args = parser.parse_args()
+
+    summary = run_pipeline(args.config, force=args.force)
+    if summary is not None:
+        print(f"\nRun: {len(summary['run'])}, skipped: {len(summary['skipped'])}, failed: {len(summary['failed'])}")
@@ -0,0 +1,235 @@
+import asyncio
+import threading
+import time
+
+# Constants
+MAX_WORKERS = 4
+
+
+class AnalysisHandle:
+    """
+    Handle on an analysis running in the background.
+
+    Attributes:
+    job_id (int): Number of the job, shown in the menus
+    name (str): Name of the analysis
+    future (concurrent.futures.Future): Future holding the analysis result
+    """
+
+    def __init__(self, job_id, name, future):
+        self.job_id = job_id
+        self.name = name
+        self.future = future
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.discarded = False
+
+    def status(self):
+        """Return one of 'pending', 'running', 'done', 'failed', 'cancelled' or 'discarded'."""
+        if self.future.cancelled():
+            return 'cancelled'
+        if self.discarded:
+            return 'discarded'
+        if self.future.done():
+            return 'failed' if self.future.exception() is not None else 'done'
+        if self.started_at is not None:
+            return 'running'
+        return 'pending'
+
+    def elapsed(self):
+        """Return the number of seconds the analysis has been (or was) running."""
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    def done(self):
+        return self.future.done()
+
+    def cancel(self):
+        """
+        Cancel the analysis if it has not started yet.
+
+        Returns:
+        bool: True when the job was cancelled, False when it is running or finished
+        """
+        if self.started_at is not None:
+            return False
+        return self.future.cancel()
+
+    def discard(self):
+        """
+        Drop the result of a running analysis.
+
+        The analysis can not be stopped: it finishes in its background thread,
+        which keeps its worker slot until then, and its result is never collected.
+        """
+        if not self.future.done():
+            self.discarded = True
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+class AnalysisExecutor:
+    """
+    Run analyses on a background asyncio loop backed by a thread pool.
+
+    Threads are used rather than processes so the jobs share the DataFrame
+    without copying it, pandas releases the GIL in most of its groupby work.
+    At most max_workers jobs run at once, each one in a daemon thread, so
+    exiting never waits for a job still running.
+    Charts must still be drawn from the main thread, so jobs should only
+    compute results (plot=False) and be rendered once collected. The
+    DataFrame given to the jobs must not be changed while they run.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self._loop = asyncio.new_event_loop()
+        self._slots = asyncio.Semaphore(max_workers)
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._lock = threading.Lock()
+        # Jobs submitted and not collected yet, and every job started with a cache key
+        self._handles = []
+        self._by_key = {}
+        self._next_id = 1
+
+    async def _run(self, handle, function, args, kwargs):
+        async with self._slots:
+            result = self._loop.create_future()
+
+            def settle(value, error):
+                # The job may have been cancelled at shutdown while its thread ran
+                if result.done():
+                    return
+                if error is not None:
+                    result.set_exception(error)
+                else:
+                    result.set_result(value)
+
+            def call():
+                value, error = None, None
+                try:
+                    value = function(*args, **kwargs)
+                except BaseException as exception:
+                    error = exception
+                finally:
+                    handle.finished_at = time.monotonic()
+                try:
+                    self._loop.call_soon_threadsafe(settle, value, error)
+                except RuntimeError:
+                    # The loop was closed at shutdown, nobody waits for the result
+                    pass
+
+            handle.started_at = time.monotonic()
+            threading.Thread(target=call, name=f'analysis-{handle.job_id}', daemon=True).start()
+            return await result
+
+    def _start(self, name, function, args, kwargs):
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+        handle = AnalysisHandle(job_id, name, None)
+        handle.future = asyncio.run_coroutine_threadsafe(
+            self._run(handle, function, args, kwargs), self._loop
+        )
+        return handle
+
+    def _live_handle(self, key):
+        handle = self._by_key.get(key)
+        if handle is None or handle.status() in ('cancelled', 'failed', 'discarded'):
+            return None
+        return handle
+
+    def submit(self, name, function, *args, key=None, **kwargs):
+        """
+        Submit an analysis and return its handle right away.
+
+        Parameters:
+        name (str): Name of the analysis, shown in the job list
+        function (callable): Analysis to run, called with args and kwargs
+        key (str): Optional cache key, a job already started (or prefetched) under
+        the same key and not collected yet is reused instead of starting a new one
+
+        Returns:
+        AnalysisHandle of the job
+        """
+        handle = self._live_handle(key) if key is not None else None
+        if handle is None:
+            handle = self._start(name, function, args, kwargs)
+            if key is not None:
+                self._by_key[key] = handle
+        with self._lock:
+            if handle not in self._handles:
+                self._handles.append(handle)
+        return handle
+
+    def prefetch(self, key, function, *args, **kwargs):
+        """
+        Start an analysis that is likely to be asked for next.
+
+        The job stays hidden from the job list until it is submitted with the same key.
+
+        Parameters:
+        key (str): Cache key later passed to submit
+        function (callable): Analysis to run, called with args and kwargs
+
+        Returns:
+        AnalysisHandle of the job
+        """
+        handle = self._live_handle(key)
+        if handle is None:
+            handle = self._by_key[key] = self._start(key, function, args, kwargs)
+        return handle
+
+    def jobs(self):
+        """Return the submitted jobs that have not been collected yet."""
+        with self._lock:
+            return list(self._handles)
+
+    def get(self, job_id):
+        """Return the submitted job with the given number, or None."""
+        for handle in self.jobs():
+            if handle.job_id == job_id:
+                return handle
+        return None
+
+    def collect_ready(self):
+        """
+        Return the submitted jobs that finished since the last call.
+
+        Returns:
+        List of AnalysisHandle, cancelled and discarded jobs are dropped silently
+        """
+        ready = []
+        for handle in self.jobs():
+            if handle.done():
+                with self._lock:
+                    self._handles.remove(handle)
+                # Asking for the analysis again computes it again
+                for key, cached in list(self._by_key.items()):
+                    if cached is handle:
+                        del self._by_key[key]
+                if not handle.future.cancelled() and not handle.discarded:
+                    ready.append(handle)
+        return ready
+
+    async def _cancel_all(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def shutdown(self):
+        """
+        Cancel the remaining jobs and stop the background loop.
+
+        Jobs already running are abandoned: their daemon threads do not keep
+        the interpreter alive.
+        """
+        asyncio.run_coroutine_threadsafe(self._cancel_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()